@@ -1,23 +1,49 @@
+import html
 import json
 import os
-import glob
+import re
 import statistics
-from datetime import datetime, timedelta, timezone
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
 from functools import lru_cache
+from operator import attrgetter, itemgetter
+
+# orjson 以 C 實作解析，其次 ujson，皆未安裝時退回標準庫 json（三者皆接受 bytes）
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        json_loads = ujson.loads
+    except ImportError:
+        json_loads = json.loads
 
 # 設定為台灣時區 (UTC+8)
 tz_tw = timezone(timedelta(hours=8))
 now_tw = datetime.now(tz_tw)
 gen_time = now_tw.strftime("%Y-%m-%d %H:%M")
+today_tw = now_tw.date()
 
 # 設定路徑
 devices_dir = 'devices'
 output_file = 'tw.html'
 
+# 每個執行緒工作項目處理的檔案數
+LOAD_BATCH_SIZE = 16
+# 檔案數不超過此值時不啟用執行緒池
+PARALLEL_MIN_FILES = 64
+
 # 定義要抓取的目標分支
 TARGET_TW = "小米澎湃 OS 中国台湾省正式版"
 TARGET_GLOBAL = "小米澎湃 OS 国际正式版"
 
+# 原始位元組預篩：不含台灣版分支名稱的檔案不會輸出，連 JSON 都不必解析
+# （\uXXXX 跳脫可大小寫混用或只跳脫部分字元，無法以位元組比對，含跳脫的檔案一律完整解析）
+TARGET_TW_MARKER = TARGET_TW.encode('utf-8')
+
 # === 優化 1: 快取版本解析結果 ===
 @lru_cache(maxsize=512)
 def version_to_tuple(v_str):
@@ -37,8 +63,14 @@ REGION_MAPPING = {
     "定制": "客製", "政企标准": "政企標準", "政企": "政企"
 }
 
+# 長字串優先，確保「中国大陆」不會先被「中国」吃掉
+REGION_PATTERN = re.compile('|'.join(
+    re.escape(k) for k in sorted(REGION_MAPPING, key=len, reverse=True)
+))
+
+@lru_cache(maxsize=None)
 def get_region_label(branch_name_zh):
-    name = branch_name_zh.replace("小米澎湃 OS ", "")
+    name = branch_name_zh.removeprefix("小米澎湃 OS ")
     if name == "正式版": return "中國"
     if name == "开发版": return "開發版"
     if name == "Beta": return "Beta"
@@ -49,37 +81,35 @@ def get_region_label(branch_name_zh):
     if core_name == "EEA": return "歐洲 EEA"
     if core_name == "欧洲EEA": return "歐洲 EEA"
 
-    processed_name = core_name
-    for sc, tc in REGION_MAPPING.items():
-        processed_name = processed_name.replace(sc, tc)
-    return processed_name
+    # 單次掃描完成所有簡轉繁替換
+    return REGION_PATTERN.sub(lambda m: REGION_MAPPING[m.group(0)], core_name)
 
 # === 優化 3: 預解析日期避免重複轉換 ===
-def parse_history_dates(history_list):
-    """提取並解析所有日期一次"""
-    dates = []
-    for item in history_list:
+@lru_cache(maxsize=4096)
+def parse_release(release):
+    """將發布日期字串轉為 date；無法解析時回傳 date.min，排序時視為最舊（同一日期常見於多台裝置，故快取）"""
+    # 標準 YYYY-MM-DD 走 fromisoformat 快速路徑
+    # （須檢查分隔符位置，否則 fromisoformat 也會接受 2024-W01-1 這類 ISO 週日期）
+    if (isinstance(release, str) and len(release) == 10 and release.isascii()
+            and release[4] == '-' and release[7] == '-'):
         try:
-            dates.append(datetime.strptime(item['release'], "%Y-%m-%d"))
-        except: 
-            pass
-    return dates
+            return date.fromisoformat(release)
+        except ValueError:
+            return date.min
+    # 空字串等缺值直接判定，不走例外路徑
+    if not release:
+        return date.min
+    # 其他寫法（如未補零的 2024-6-1）交給 strptime，與原本的解析結果一致
+    try:
+        return datetime.strptime(release, "%Y-%m-%d").date()
+    except (TypeError, ValueError):
+        return date.min
 
-def is_abandoned_mad(history_list, days_since_last):
-    if not history_list or len(history_list) < 2:
-        return False
-    
-    dates = parse_history_dates(history_list)
-    if len(dates) < 2:
-        return False
-    
-    # 計算間隔（利用已排序特性）
-    intervals = [
-        (dates[i] - dates[i+1]).days 
-        for i in range(len(dates) - 1) 
-        if (dates[i] - dates[i+1]).days >= 0
-    ]
-    
+def get_history_intervals(history_list):
+    """取出已排序歷史中相鄰版本的間隔天數（由 collect_devices 預先計算；日期無法解析的版本沒有間隔，值為 None）"""
+    return [rom.interval for rom in history_list if rom.interval is not None]
+
+def is_abandoned_mad(intervals, days_since_last):
     if not intervals:
         return False
 
@@ -90,224 +120,389 @@ def is_abandoned_mad(history_list, days_since_last):
     
     return score > 4
 
-def get_max_interval(history_list):
-    """計算歷史更新最大間隔天數"""
-    if not history_list or len(history_list) < 2:
-        return 0
-    
-    dates = parse_history_dates(history_list)
-    if len(dates) < 2:
-        return 0
-    
-    intervals = [
-        (dates[i] - dates[i+1]).days 
-        for i in range(len(dates) - 1) 
-        if (dates[i] - dates[i+1]).days >= 0
-    ]
-    
-    if not intervals:
-        return 0
-        
-    return max(intervals)
-
-print(f"::group::初始化設定")
-print(f"工作目錄: {os.getcwd()}")
-print(f"輸出檔案: {output_file}")
-print(f"::endgroup::")
+# 一次取出 ROM 的三個欄位（C 實作，不經 .get 的方法查找）
+get_rom_fields = itemgetter('os', 'android', 'release')
+
+class Rom:
+    """單一 ROM 紀錄；使用 __slots__ 取代 dict，降低每筆紀錄的記憶體與屬性查找成本"""
+    __slots__ = ('os', 'android', 'release', 'date', 'interval', 'ver_tuple')
+
+    def __init__(self, os_ver, android, release):
+        self.os = os_ver
+        self.android = android
+        self.release = release
+        self.date = parse_release(release)
+        self.interval = None
+        self.ver_tuple = None
+
+# ROM 與分支都帶有 date 屬性，裝置則帶有 'date' 鍵（台灣版最新版的發布日），排序直接取值，不經 lambda
+get_date = attrgetter('date')
+get_device_date = itemgetter('date')
+
+class Branch:
+    """單一分支紀錄（最新版、其發布日、完整歷史與地區標籤），同樣以 __slots__ 取代 dict"""
+    __slots__ = ('latest', 'date', 'history', 'label')
+
+    def __init__(self, rom_list, label=None):
+        # 歷史紀錄延後到確定輸出時才排序，這裡只取最新一筆
+        latest = max(rom_list, key=get_date)
+        # 版本比較只需要各分支最新一版，於讀取時解析一次
+        latest.ver_tuple = version_to_tuple(latest.os)
+        self.latest = latest
+        self.date = latest.date
+        self.history = rom_list
+        self.label = label
+
+
+# 缺少 roms 的分支共用同一個空 dict（唯讀），避免每次缺漏都新建一個
+EMPTY_ROMS = {}
+
+def extract_device_fields(data):
+    """擷取頁面用到的欄位並完成分支分類 (名稱, 代號, [(分支類型, 品牌, 分支資料)])，完整 JSON 樹隨即釋放"""
+    # 必要欄位缺漏或型別不符時轉為 ValueError，由呼叫端當作資料錯誤回報
+    try:
+        device_name = data['name']['zh']
+        device_code = data['device']
+    except (KeyError, TypeError) as e:
+        raise ValueError(f"缺少必要欄位 name.zh 或 device: {e!r}") from e
 
-# === 資料收集階段 ===
-devices_map = {}
-all_brands = set()
-json_files = glob.glob(os.path.join(devices_dir, '*.json'))
-print(f"Found {len(json_files)} device files. Processing...")
+    branches = []
+    for branch in data.get('branches') or ():
+        try:
+            branch_name_zh = branch['name']['zh']
+        except (KeyError, TypeError):
+            continue
+
+        if branch_name_zh == TARGET_TW:
+            target_type = 'tw'
+        elif branch_name_zh == TARGET_GLOBAL:
+            target_type = 'global'
+        else:
+            target_type = 'other'
 
-for file_path in json_files:
+        rom_list = []
+        for k, v in (branch.get('roms') or EMPTY_ROMS).items():
+            try:
+                os_ver, android, release = get_rom_fields(v)
+            except KeyError:
+                os_ver = v.get('os', k)
+                android = v.get('android', '')
+                release = v.get('release', '1970-01-01')
+            rom_list.append(Rom(os_ver, android, release))
+
+        info_obj = None
+        if rom_list:
+            label = None
+            if target_type == 'other':
+                label = html.escape(get_region_label(branch_name_zh) or branch_name_zh)
+            info_obj = Branch(rom_list, label)
+
+        # 品牌名稱只有少數幾種，駐留後各檔案共用同一字串物件，集合與比較也更快
+        brand = branch.get('brand', 'Xiaomi')
+        if isinstance(brand, str):
+            brand = sys.intern(brand)
+        branches.append((target_type, brand, info_obj))
+
+    return device_name, device_code, branches
+
+def load_device_file(file_path):
+    """讀取並解析單一裝置檔；沒有台灣版分支時回傳 None"""
+    # 直接以檔案描述子依檔案大小一次讀完，不建立 Python 檔案物件
+    fd = os.open(file_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        device_name = data.get('name', {}).get('zh', 'Unknown Device')
-        device_code = data.get('device', '')
-        
-        if device_code not in devices_map:
-            devices_map[device_code] = {
-                'name': device_name,
-                'code': device_code,
-                'brand': 'Other',
-                'tw': None,
-                'global': None,
-                'others': []
-            }
-        
-        branches = data.get('branches', [])
-        for branch in branches:
-            branch_name_zh = branch.get('name', {}).get('zh', '')
-            
-            target_type = None
-            branch_label = ""
-
-            if branch_name_zh == TARGET_TW:
-                target_type = 'tw'
-                brand = branch.get('brand', 'Xiaomi')
-                if brand: 
-                    devices_map[device_code]['brand'] = brand
-            elif branch_name_zh == TARGET_GLOBAL:
-                target_type = 'global'
-            else:
-                target_type = 'other'
-                branch_label = get_region_label(branch_name_zh)
-                if not branch_label: 
-                    branch_label = branch_name_zh
-            
-            roms = branch.get('roms', {})
-            if not roms: 
-                continue
-            
-            rom_list = [
-                {
-                    'os': v.get('os', k),
-                    'android': v.get('android', ''),
-                    'release': v.get('release', '1970-01-01')
-                }
-                for k, v in roms.items()
-            ]
-            rom_list.sort(key=lambda x: x['release'], reverse=True)
-            
-            if rom_list:
-                info_obj = {
-                    'latest': rom_list[0],
-                    'history': rom_list
-                }
-                
-                if target_type == 'tw':
-                    devices_map[device_code]['tw'] = info_obj
-                elif target_type == 'global':
-                    devices_map[device_code]['global'] = info_obj
-                elif target_type == 'other':
-                    info_obj['label'] = branch_label
-                    devices_map[device_code]['others'].append(info_obj)
-                
-    except Exception as e:
-        print(f"Error processing {file_path}: {e}")
-
-# 篩選與排序
-final_list = []
-for code, info in devices_map.items():
-    if info['tw']:
-        if info['others']:
-            info['others'].sort(key=lambda x: x['latest']['release'], reverse=True)
-        final_list.append(info)
-        all_brands.add(info['brand'])
+        size = os.fstat(fd).st_size
+        raw = os.read(fd, size)
+        # 單次 read 可能回傳不足的位元組數，補讀到檔案大小或 EOF 為止
+        if len(raw) < size:
+            chunks = [raw]
+            remaining = size - len(raw)
+            while remaining:
+                chunk = os.read(fd, remaining)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                remaining -= len(chunk)
+            raw = b''.join(chunks)
+    finally:
+        os.close(fd)
+    if TARGET_TW_MARKER not in raw and b'\\u' not in raw:
+        return None
+    return extract_device_fields(json_loads(raw))
+
+def load_device_batch(paths):
+    """批次讀取多個裝置檔，攤銷每個工作項目的排程成本；失敗時回傳例外物件"""
+    results = []
+    for path in paths:
+        try:
+            results.append(load_device_file(path))
+        except (OSError, ValueError) as e:
+            # 讀檔失敗、JSON 格式錯誤或缺少必要欄位；其他例外屬程式錯誤，直接拋出
+            results.append(e)
+    return results
+
+def load_device_files(json_files):
+    """依輸入順序讀取所有裝置檔；檔案少或只有單核心時直接依序處理，省去執行緒池的排程成本"""
+    if len(json_files) <= PARALLEL_MIN_FILES or (os.cpu_count() or 1) == 1:
+        return load_device_batch(json_files)
+
+    # 讀檔、解析與分支整理分批並行處理
+    batches = [json_files[i:i + LOAD_BATCH_SIZE] for i in range(0, len(json_files), LOAD_BATCH_SIZE)]
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) * 4)) as executor:
+        return [
+            item
+            for batch_result in executor.map(load_device_batch, batches)
+            for item in batch_result
+        ]
+
+# === 優化 4: 歷史表改由前端在首次展開時產生，頁面只內嵌精簡的 JSON 資料 ===
+HISTORY_TEMPLATE = (
+    '<div class="hidden mt-2 border-t border-gray-100 pt-2 animate-fade-in" '
+    'data-type="{type_class}" data-history=\'{rows}\'></div>'
+)
 
-final_list.sort(key=lambda x: x['tw']['latest']['release'], reverse=True)
+def generate_history_html(history_list, type_class):
+    """輸出歷史表的佔位元素，每列為 [版本, 日期, 間隔天數, Android]"""
+    rows = json.dumps(
+        [[rom.os, rom.release, rom.interval, rom.android] for rom in history_list],
+        ensure_ascii=False, separators=(',', ':')
+    )
+    # 屬性值以單引號包住，JSON 內的雙引號不必跳脫
+    rows = html.escape(rows, quote=False).replace("'", '&#x27;')
+    return HISTORY_TEMPLATE.format(type_class=type_class, rows=rows)
+
+# 區塊卡片樣板：模組載入時建立一次，每張卡片只以 format_map 填值
+CARD_TEMPLATE = (
+    '<div class="{group_class}">'
+    '<button type="button" onclick="toggleHistory(this)" aria-expanded="false" '
+    'class="w-full cursor-pointer flex items-center justify-between p-3 rounded-lg {bg_color} border {border_color} {hover_bg} transition-colors relative select-none focus:outline-none focus:ring-2 focus:ring-blue-500 text-left">'
+    '<div class="flex items-center gap-3">'
+    '<span class="inline-flex items-center px-2 py-1 rounded text-xs font-medium {badge_bg} {badge_text} shadow-sm transition-colors">{region_label} ▾</span>'
+    '<div><div class="text-sm font-mono text-gray-700 font-bold">{ver_str}</div>'
+    '<div class="text-xs text-gray-600">Android {android}</div></div></div>'
+    '<div class="flex flex-col items-end">'
+    '<div class="text-xs text-gray-600 font-medium">{release}</div>'
+    '{ago_html}{ver_status_tag}</div></button>{history_html}</div>'
+)
+
+# 樣式配置：各地區的樣式固定，預先填入模板，渲染時只替換資料欄位
+CARD_STYLE_KEYS = ('bg_color', 'border_color', 'badge_bg', 'badge_text', 'hover_bg', 'group_class')
+CARD_STYLES = {
+    'tw': ('bg-blue-50/50', 'border-blue-100', 'bg-blue-100', 'text-blue-700', 'hover:bg-blue-50', 'group/tw'),
+    'global': ('bg-white/50', 'border-gray-300 border-dashed', 'bg-gray-100', 'text-gray-600', 'hover:bg-gray-50', 'group/gl'),
+    'other': ('bg-purple-50/30', 'border-purple-100 border-dashed', 'bg-purple-100', 'text-purple-700', 'hover:bg-purple-50', 'group/ot')
+}
 
-brand_options_list = ['<option value="all">所有品牌</option>']
-for brand in sorted(list(all_brands)):
-    brand_options_list.append(f'<option value="{brand}">{brand}</option>')
-brand_options = ''.join(brand_options_list)
+def build_card_template(styles):
+    """將一組樣式字串填入 CARD_TEMPLATE，保留其餘欄位供 format_map 使用"""
+    template = CARD_TEMPLATE
+    for key, value in zip(CARD_STYLE_KEYS, styles):
+        template = template.replace('{' + key + '}', value)
+    return template
+
+CARD_TEMPLATES = {region_type: build_card_template(styles) for region_type, styles in CARD_STYLES.items()}
+
+# === 優化 5: 「N 天前」標示只取決於天數，多張卡片共用同一發布日時直接命中快取 ===
+@lru_cache(maxsize=None)
+def days_since(release_date):
+    """發布日至今的天數（today_tw 於執行期間固定，可依日期快取）"""
+    return (today_tw - release_date).days
+
+@lru_cache(maxsize=None)
+def card_ago_html(release_date):
+    """地區卡片的「(N 天前)」標示；日期無法解析時不顯示"""
+    if release_date == date.min:
+        return ""
+    days = days_since(release_date)
+    return f'<div class="text-[11px] text-gray-600 mt-0.5">({days} 天前)</div>'
+
+# 依天數分段的顏色：索引 = (天數 > 30) + (天數 > 90)，即 30 天內、31–90 天、超過 90 天
+AGO_COLORS = ("text-green-700 bg-green-50", "text-gray-600 bg-gray-100", "text-orange-700 bg-orange-50")
+
+@lru_cache(maxsize=None)
+def device_ago_html(days_ago):
+    """裝置標題的「已過 N 天」標示，依天數分色"""
+    ago_color = AGO_COLORS[(days_ago > 30) + (days_ago > 90)]
+    return f'<span class="text-xs font-medium px-1.5 py-0.5 rounded mt-1 {ago_color}">已過 {days_ago} 天</span>'
+
+# 與台灣版比較的結果標籤：1 = 領先、-1 = 落後、0 = 同步
+VERSION_STATUS_TAGS = {
+    1: '<span class="text-xs px-1.5 py-0.5 rounded text-green-700 bg-green-50">↑ 領先</span>',
+    -1: '<span class="text-xs px-1.5 py-0.5 rounded text-red-700 bg-red-50">↓ 落後</span>',
+    0: '<span class="text-xs px-1.5 py-0.5 rounded text-gray-600 bg-gray-100">= 同步</span>'
+}
 
-print(f"Collected {len(final_list)} devices.")
+# 沒有國際版資料時的佔位卡片（內容固定，直接回傳同一字串）
+EMPTY_GLOBAL_CARD = '<div class="flex items-center justify-center p-3 rounded-lg border border-dashed border-gray-200 bg-gray-50 h-[88px]"><span class="text-xs text-gray-400 italic">無國際版資料</span></div>'
 
-# === 優化 4: 批次生成 HTML (使用 list) ===
-def generate_history_html(history_list, type_class):
-    parts = [
-        f'<div class="hidden mt-2 border-t border-gray-100 pt-2 animate-fade-in" data-type="{type_class}">',
-        '<table class="w-full text-xs text-left">',
-        '<thead class="text-gray-500 font-medium border-b border-gray-50"><tr>',
-        '<th class="py-2 pl-1">版本</th><th class="py-2">日期</th>',
-        '<th class="py-2 text-center">間隔</th><th class="py-2 text-right pr-1">Android</th>',
-        '</tr></thead><tbody class="divide-y divide-gray-50">'
-    ]
-    
-    for i, rom in enumerate(history_list):
-        interval_html = '<span class="text-gray-300">-</span>'
-        
-        if i < len(history_list) - 1:
-            try:
-                current_date = datetime.strptime(rom['release'], "%Y-%m-%d")
-                prev_date = datetime.strptime(history_list[i+1]['release'], "%Y-%m-%d")
-                delta_days = (current_date - prev_date).days
-                
-                if delta_days > 90: 
-                    bg_color = "bg-orange-50 text-orange-600"
-                elif delta_days < 30: 
-                    bg_color = "bg-green-50 text-green-600"
-                else: 
-                    bg_color = "bg-gray-100 text-gray-600"
-                    
-                interval_html = f'<span class="px-1.5 py-0.5 rounded {bg_color}">{delta_days} 天</span>'
-            except: 
-                pass
-        else:
-            interval_html = '<span class="text-xs text-blue-600">首版</span>'
-
-        parts.append(
-            f'<tr class="hover:bg-gray-50 transition-colors">'
-            f'<td class="py-2 pl-1 font-mono text-gray-700">{rom["os"]}</td>'
-            f'<td class="py-2 text-gray-600">{rom["release"]}</td>'
-            f'<td class="py-2 text-center">{interval_html}</td>'
-            f'<td class="py-2 text-right pr-1 text-gray-600">{rom["android"]}</td>'
-            f'</tr>'
-        )
-    
-    parts.append('</tbody></table></div>')
-    return ''.join(parts)
-
-def generate_card_html(info, region_label, region_type, tw_ver_str=None):
+def generate_card_html(info, region_label, region_type, tw_ver_tuple=None):
     if not info:
         if region_type == 'global':
-            return '<div class="flex items-center justify-center p-3 rounded-lg border border-dashed border-gray-200 bg-gray-50 h-[88px]"><span class="text-xs text-gray-400 italic">無國際版資料</span></div>'
+            return EMPTY_GLOBAL_CARD
         return ""
 
-    latest = info['latest']
-    ver_str = latest['os']
+    latest = info.latest
+    ver_str = latest.os
     
     # 版本比較
     ver_status_tag = ""
-    if region_type != 'tw' and tw_ver_str:
-        tw_tup = version_to_tuple(tw_ver_str)
-        curr_tup = version_to_tuple(ver_str)
-        if tw_tup < curr_tup:
-            ver_status_tag = '<span class="text-xs px-1.5 py-0.5 rounded text-green-700 bg-green-50">↑ 領先</span>'
-        elif tw_tup > curr_tup:
-            ver_status_tag = '<span class="text-xs px-1.5 py-0.5 rounded text-red-700 bg-red-50">↓ 落後</span>'
-        else:
-            ver_status_tag = '<span class="text-xs px-1.5 py-0.5 rounded text-gray-600 bg-gray-100">= 同步</span>'
+    if region_type != 'tw' and tw_ver_tuple is not None:
+        curr_tup = latest.ver_tuple
+        ver_status_tag = VERSION_STATUS_TAGS[(curr_tup > tw_ver_tuple) - (curr_tup < tw_ver_tuple)]
 
-    # 樣式配置
-    styles = {
-        'tw': ('bg-blue-50/50', 'border-blue-100', 'bg-blue-100', 'text-blue-700', 'hover:bg-blue-50', 'group/tw'),
-        'global': ('bg-white/50', 'border-gray-300 border-dashed', 'bg-gray-100', 'text-gray-600', 'hover:bg-gray-50', 'group/gl'),
-        'other': ('bg-purple-50/30', 'border-purple-100 border-dashed', 'bg-purple-100', 'text-purple-700', 'hover:bg-purple-50', 'group/ot')
-    }
-    bg_color, border_color, badge_bg, badge_text, hover_bg, group_class = styles[region_type]
+    history_html = generate_history_html(info.history, f'{region_type}-history')
+    
+    ago_html = card_ago_html(latest.date)
+
+    # 版本、Android 與日期皆取自資料檔，須跳脫（android 可能是數字，先轉字串）
+    return CARD_TEMPLATES[region_type].format_map({
+        'region_label': region_label,
+        'ver_str': html.escape(str(ver_str)),
+        'android': html.escape(str(latest.android)),
+        'release': html.escape(str(latest.release)),
+        'ago_html': ago_html,
+        'ver_status_tag': ver_status_tag,
+        'history_html': history_html
+    })
+
+def collect_devices(json_files):
+    """讀取所有裝置檔，回傳依台灣版發布日期排序的裝置清單與品牌集合"""
+    devices_map = {}
+    final_list = []
+
+    skipped = 0
+
+    # 主執行緒只負責彙整，不需加鎖
+    for file_path, record in zip(json_files, load_device_files(json_files)):
+        # 讀檔或解析失敗只影響該檔案；彙整本身不會拋例外，不需包在 try 內
+        if record is None:
+            skipped += 1
+            continue
+        if isinstance(record, Exception):
+            print(f"Error processing {file_path}: {record}")
+            continue
+
+        device_name, device_code, branches = record
+        device_info = devices_map.get(device_code)
+        if device_info is None:
+            device_info = devices_map[device_code] = {
+                'name': device_name,
+                'code': device_code,
+                'brand': 'Other',
+                'tw': None,
+                'date': date.min,
+                'global': None,
+                'others': []
+            }
+
+        for target_type, brand, info_obj in branches:
+            if target_type == 'tw' and brand:
+                device_info['brand'] = brand
+            if info_obj is None:
+                continue
 
-    history_html = generate_history_html(info['history'], f'{region_type}-history')
+            if target_type == 'tw':
+                # 第一次取得台灣版資料時即列入輸出清單
+                if device_info['tw'] is None:
+                    final_list.append(device_info)
+                device_info['tw'] = info_obj
+                device_info['date'] = info_obj.date
+            elif target_type == 'global':
+                device_info['global'] = info_obj
+            else:
+                device_info['others'].append(info_obj)
+
+    # 預篩或解析後沒有台灣版分支的檔案不輸出；列出數量，頁面意外變空時可據此追查
+    print(f"Skipped {skipped} device files without a Taiwan branch.")
+
+    # 排序（輸出清單已於收集階段建立）
+    for info in final_list:
+        for branch_info in (info['tw'], info['global'], *info['others']):
+            if branch_info:
+                history = branch_info.history
+                history.sort(key=get_date, reverse=True)
+                # 預先計算與前一版的間隔天數，渲染歷史表時不再做日期運算
+                for rom, prev_rom in zip(history, history[1:]):
+                    if rom.date != date.min and prev_rom.date != date.min:
+                        rom.interval = (rom.date - prev_rom.date).days
+        if info['others']:
+            info['others'].sort(key=get_date, reverse=True)
+
+    final_list.sort(key=get_device_date, reverse=True)
+
+    # 品牌可能在列入清單後被同裝置的其他台灣版分支更新，須以最終值建立
+    all_brands = {info['brand'] for info in final_list}
+    return final_list, all_brands
+
+# 裝置卡片樣板：與 CARD_TEMPLATE 相同，模組載入時建立一次
+DEVICE_TEMPLATE = (
+    '<div class="device-card bg-white rounded-2xl p-5 mb-4 shadow-sm hover:shadow-md transition-all border border-gray-100" data-brand="{brand}" data-date="{tw_date}" data-search="{search}">'
+    '<div class="flex flex-col sm:flex-row sm:items-start justify-between gap-4 mb-4">'
+    '<div class="flex items-start gap-3">'
+    '<div class="h-10 w-10 rounded-full bg-blue-50 flex items-center justify-center text-blue-700 font-bold text-lg flex-shrink-0">{initial}</div>'
+    '<div><h2 class="text-lg font-bold text-gray-900 leading-tight device-title">{name}</h2>'
+    '<div class="flex items-center gap-2 mt-1">'
+    '<span class="text-xs font-mono text-gray-600 bg-gray-50 px-1.5 py-0.5 rounded border border-gray-100 device-code">{code}</span>'
+    '<span class="text-xs text-gray-600 bg-gray-50 px-1.5 py-0.5 rounded border border-gray-100">{brand}</span>'
+    '</div></div></div>'
+    '<div class="flex flex-col items-end">'
+    '<span class="text-sm font-bold text-gray-700 bg-gray-50 px-2 py-1 rounded-md">{tw_date}</span>'
+    '{ago_html}</div></div>'
+    '<div class="grid grid-cols-1 md:grid-cols-2 gap-3">{tw_card}{gl_card}{others_cards}</div>'
+    '</div>'
+)
+
+BRAND_OPTION_TEMPLATE = '<option value="{brand}">{brand}</option>'
+
+def render_device_html(device):
+    """生成單一裝置的完整卡片 HTML"""
+    tw = device['tw'].latest
+    tw_ver_tuple = tw.ver_tuple
+    tw_date = tw.release
+    tw_history = device['tw'].history
     
-    # 計算天數
+    # Header Info
     ago_html = ""
-    try:
-        dt = datetime.strptime(latest['release'], "%Y-%m-%d").replace(tzinfo=tz_tw)
-        days = (now_tw - dt).days
-        ago_html = f'<div class="text-[11px] text-gray-600 mt-0.5">({days} 天前)</div>'
-    except: 
-        pass
-
-    return (
-        f'<div class="{group_class}">'
-        f'<button type="button" onclick="toggleHistory(this)" aria-expanded="false" '
-        f'class="w-full cursor-pointer flex items-center justify-between p-3 rounded-lg {bg_color} border {border_color} {hover_bg} transition-colors relative select-none focus:outline-none focus:ring-2 focus:ring-blue-500 text-left">'
-        f'<div class="flex items-center gap-3">'
-        f'<span class="inline-flex items-center px-2 py-1 rounded text-xs font-medium {badge_bg} {badge_text} shadow-sm transition-colors">{region_label} ▾</span>'
-        f'<div><div class="text-sm font-mono text-gray-700 font-bold">{ver_str}</div>'
-        f'<div class="text-xs text-gray-600">Android {latest["android"]}</div></div></div>'
-        f'<div class="flex flex-col items-end">'
-        f'<div class="text-xs text-gray-600 font-medium">{latest["release"]}</div>'
-        f'{ago_html}{ver_status_tag}</div></button>{history_html}</div>'
-    )
+    tw_release_date = tw.date
+    if tw_release_date != date.min:
+        days_ago = days_since(tw_release_date)
+        # 間隔只取一次，同時供最大間隔與 MAD 判斷使用
+        intervals = get_history_intervals(tw_history)
+        max_interval = max(intervals, default=0)
+        is_abandoned = (max_interval > 0 and days_ago > 2 * max_interval) or is_abandoned_mad(intervals, days_ago)
+
+        if is_abandoned:
+            ago_html = f'<span class="text-xs font-medium px-1.5 py-0.5 rounded mt-1 text-white" style="background-color: #6b7280;">疑似棄更 ({days_ago} 天)</span>'
+        else:
+            ago_html = device_ago_html(days_ago)
 
-# === 優化 5: 主 HTML 使用 list 累積 ===
-html_parts = [f"""<!DOCTYPE html>
+    tw_card = generate_card_html(device['tw'], "台灣版", 'tw')
+    gl_card = generate_card_html(device['global'], "國際版", 'global', tw_ver_tuple)
+    
+    # join 會先把 generator 轉成 list，直接給 list 可省去這一步
+    others_cards = ''.join([
+        generate_card_html(other, other.label, 'other', tw_ver_tuple)
+        for other in device['others']
+    ])
+
+    # 來自資料檔的文字欄位只在此跳脫一次；搜尋字串預先轉小寫，前端不必每次按鍵再處理
+    # 名稱與代號以換行分隔：單行輸入框打不出換行，查詢不會橫跨兩個欄位
+    name = device['name']
+    code = device['code']
+    return DEVICE_TEMPLATE.format_map({
+        'brand': html.escape(device['brand']),
+        'tw_date': html.escape(str(tw_date)),
+        'search': f"{html.escape(name.lower())}&#10;{html.escape(code.lower())}",
+        'initial': html.escape(name[0]),
+        'name': html.escape(name),
+        'code': html.escape(code),
+        'ago_html': ago_html,
+        'tw_card': tw_card,
+        'gl_card': gl_card,
+        'others_cards': others_cards
+    })
+
+# === 頁面外框：只有更新時間、品牌選項與裝置數需要代入，其餘固定 ===
+PAGE_HEADER_TEMPLATE = """<!DOCTYPE html>
 <html lang="zh-TW">
 <head>
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
@@ -362,71 +557,57 @@ html_parts = [f"""<!DOCTYPE html>
         </div>
     </div>
     <main class="max-w-4xl mx-auto px-4 mt-6" id="content">
-"""]
-
-# 生成設備卡片
-for device in final_list:
-    tw = device['tw']['latest']
-    tw_ver = tw['os']
-    tw_date = tw['release']
-    tw_history = device['tw']['history']
-    
-    # Header Info
-    ago_html = ""
-    try:
-        tw_dt = datetime.strptime(tw_date, "%Y-%m-%d").replace(tzinfo=tz_tw)
-        days_ago = (now_tw - tw_dt).days
-        max_interval = get_max_interval(tw_history)
-        is_abandoned = is_abandoned_mad(tw_history, days_ago) or (max_interval > 0 and days_ago > 2 * max_interval)
-
-        if is_abandoned:
-            ago_html = f'<span class="text-xs font-medium px-1.5 py-0.5 rounded mt-1 text-white" style="background-color: #6b7280;">疑似棄更 ({days_ago} 天)</span>'
-        else:
-            status_text = f"已過 {days_ago} 天"
-            if days_ago > 90: 
-                ago_color = "text-orange-700 bg-orange-50"
-            elif days_ago > 30: 
-                ago_color = "text-gray-600 bg-gray-100"
-            else: 
-                ago_color = "text-green-700 bg-green-50"
-            ago_html = f'<span class="text-xs font-medium px-1.5 py-0.5 rounded mt-1 {ago_color}">{status_text}</span>'
-    except: 
-        pass
-
-    tw_card = generate_card_html(device['tw'], "台灣版", 'tw')
-    gl_card = generate_card_html(device['global'], "國際版", 'global', tw_ver)
-    
-    others_cards = ''.join(
-        generate_card_html(other, other['label'], 'other', tw_ver)
-        for other in device['others']
-    ) if device['others'] else ""
-
-    html_parts.append(
-        f'<div class="device-card bg-white rounded-2xl p-5 mb-4 shadow-sm hover:shadow-md transition-all border border-gray-100" data-brand="{device["brand"]}" data-date="{tw_date}">'
-        f'<div class="flex flex-col sm:flex-row sm:items-start justify-between gap-4 mb-4">'
-        f'<div class="flex items-start gap-3">'
-        f'<div class="h-10 w-10 rounded-full bg-blue-50 flex items-center justify-center text-blue-700 font-bold text-lg flex-shrink-0">{device["name"][0]}</div>'
-        f'<div><h2 class="text-lg font-bold text-gray-900 leading-tight device-title">{device["name"]}</h2>'
-        f'<div class="flex items-center gap-2 mt-1">'
-        f'<span class="text-xs font-mono text-gray-600 bg-gray-50 px-1.5 py-0.5 rounded border border-gray-100 device-code">{device["code"]}</span>'
-        f'<span class="text-xs text-gray-600 bg-gray-50 px-1.5 py-0.5 rounded border border-gray-100">{device["brand"]}</span>'
-        f'</div></div></div>'
-        f'<div class="flex flex-col items-end">'
-        f'<span class="text-sm font-bold text-gray-700 bg-gray-50 px-2 py-1 rounded-md">{tw_date}</span>'
-        f'{ago_html}</div></div>'
-        f'<div class="grid grid-cols-1 md:grid-cols-2 gap-3">{tw_card}{gl_card}{others_cards}</div>'
-        f'</div>'
-    )
+"""
 
-html_parts.append(f"""
+PAGE_FOOTER_TEMPLATE = """
     </main>
     <div class="max-w-4xl mx-auto px-4 py-8 text-center text-gray-500 text-xs">
-        Generated by GitHub Actions • Total {len(final_list)} Devices
+        Generated by GitHub Actions • Total {device_count} Devices
     </div>
     <script>
+        const historyHead = '<table class="w-full text-xs text-left">'
+            + '<thead class="text-gray-500 font-medium border-b border-gray-50"><tr>'
+            + '<th class="py-2 pl-1">版本</th><th class="py-2">日期</th>'
+            + '<th class="py-2 text-center">間隔</th><th class="py-2 text-right pr-1">Android</th>'
+            + '</tr></thead><tbody class="divide-y divide-gray-50">';
+
+        // 索引 = (間隔 >= 30) + (間隔 > 90)：30 天內、30–90 天、超過 90 天
+        const intervalColors = ['bg-green-50 text-green-600', 'bg-gray-100 text-gray-600', 'bg-orange-50 text-orange-600'];
+
+        function escapeHtml(value) {{
+            return String(value).replace(/[&<>"']/g, ch => '&#' + ch.charCodeAt(0) + ';');
+        }}
+
+        function historyTableHtml(rows) {{
+            const last = rows.length - 1;
+            const body = rows.map(([ver, release, interval, android], i) => {{
+                let intervalHtml;
+                if (i === last) {{
+                    intervalHtml = '<span class="text-xs text-blue-600">首版</span>';
+                }} else if (interval === null) {{
+                    intervalHtml = '<span class="text-gray-300">-</span>';
+                }} else {{
+                    const color = intervalColors[(interval >= 30) + (interval > 90)];
+                    intervalHtml = `<span class="px-1.5 py-0.5 rounded ${{color}}">${{interval}} 天</span>`;
+                }}
+                return '<tr class="hover:bg-gray-50 transition-colors">'
+                    + `<td class="py-2 pl-1 font-mono text-gray-700">${{escapeHtml(ver)}}</td>`
+                    + `<td class="py-2 text-gray-600">${{escapeHtml(release)}}</td>`
+                    + `<td class="py-2 text-center">${{intervalHtml}}</td>`
+                    + `<td class="py-2 text-right pr-1 text-gray-600">${{escapeHtml(android)}}</td>`
+                    + '</tr>';
+            }});
+            return historyHead + body.join('') + '</tbody></table>';
+        }}
+
         function toggleHistory(element) {{
             const historyDiv = element.nextElementSibling;
             if (historyDiv) {{
+                // 第一次展開時才由內嵌資料產生表格
+                if (historyDiv.dataset.history) {{
+                    historyDiv.innerHTML = historyTableHtml(JSON.parse(historyDiv.dataset.history));
+                    delete historyDiv.dataset.history;
+                }}
                 const isHidden = historyDiv.classList.toggle('hidden');
                 element.setAttribute('aria-expanded', !isHidden);
             }}
@@ -435,22 +616,21 @@ html_parts.append(f"""
         const brandFilter = document.getElementById('brandFilter');
         const recentFilter = document.getElementById('recentFilter');
         const daysLabel = document.getElementById('daysLabel');
+        const cards = document.querySelectorAll('.device-card');
         let recentDaysThreshold = 30;
+        let searchTimer;
 
         function filterContent() {{
             const searchText = searchInput.value.toLowerCase().trim();
             const selectedBrand = brandFilter.value;
             const isRecent = recentFilter.checked;
-            const cards = document.querySelectorAll('.device-card');
             const now = new Date();
 
             cards.forEach(card => {{
-                const name = card.querySelector('.device-title').textContent.toLowerCase();
-                const code = card.querySelector('.device-code').textContent.toLowerCase();
                 const brand = card.getAttribute('data-brand');
                 const dateStr = card.getAttribute('data-date');
                 
-                const matchText = name.includes(searchText) || code.includes(searchText);
+                const matchText = card.getAttribute('data-search').includes(searchText);
                 const matchBrand = (selectedBrand === 'all') || (brand === selectedBrand);
                 
                 let matchRecent = true;
@@ -465,7 +645,10 @@ html_parts.append(f"""
             }});
         }}
         
-        searchInput.addEventListener('input', filterContent);
+        searchInput.addEventListener('input', () => {{
+            clearTimeout(searchTimer);
+            searchTimer = setTimeout(filterContent, 100);
+        }});
         brandFilter.addEventListener('change', filterContent);
         recentFilter.addEventListener('change', filterContent);
 
@@ -496,10 +679,54 @@ html_parts.append(f"""
     </script>
 </body>
 </html>
-""")
-
-# 一次性寫入
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.write(''.join(html_parts))
-
-print(f"✓ Generated {output_file} with {len(final_list)} devices")
+"""
+
+def reset_run_state():
+    """以當下時間重設時鐘並清空所有快取，讓同一行程中重複呼叫 main() 時結果與計時都與首次執行一致"""
+    global now_tw, gen_time, today_tw
+    now_tw = datetime.now(tz_tw)
+    gen_time = now_tw.strftime("%Y-%m-%d %H:%M")
+    today_tw = now_tw.date()
+    for cached in (version_to_tuple, get_region_label, parse_release,
+                   days_since, card_ago_html, device_ago_html):
+        cached.cache_clear()
+
+def main():
+    start_time = time.perf_counter()
+    reset_run_state()
+
+    print(f"::group::初始化設定")
+    print(f"工作目錄: {os.getcwd()}")
+    print(f"輸出檔案: {output_file}")
+    print(f"::endgroup::")
+
+    # === 資料收集階段 ===
+    with os.scandir(devices_dir) as entries:
+        json_files = [e.path for e in entries if e.name.endswith('.json') and e.is_file()]
+    print(f"Found {len(json_files)} device files. Processing...")
+    final_list, all_brands = collect_devices(json_files)
+
+    brand_options = '<option value="all">所有品牌</option>' + ''.join([
+        BRAND_OPTION_TEMPLATE.format(brand=html.escape(brand)) for brand in sorted(all_brands)
+    ])
+
+    device_count = len(final_list)
+    print(f"Collected {device_count} devices.")
+
+    # === 優化 6: 主 HTML 逐段串流寫入檔案，不在記憶體保留整份文件 ===
+    # 以二進位模式寫入：每段只編碼一次，並略過文字層的換行轉換
+    with open(output_file, 'wb', buffering=1 << 20) as f:
+        f.write(PAGE_HEADER_TEMPLATE.format(gen_time=gen_time, brand_options=brand_options).encode('utf-8'))
+
+        # 生成設備卡片：逐一取出後寫入即釋放，尖峰記憶體只需容納單一裝置
+        final_list.reverse()
+        while final_list:
+            f.write(render_device_html(final_list.pop()).encode('utf-8'))
+
+        f.write(PAGE_FOOTER_TEMPLATE.format(device_count=device_count).encode('utf-8'))
+
+    elapsed = time.perf_counter() - start_time
+    print(f"✓ Generated {output_file} with {device_count} devices in {elapsed:.2f}s")
+
+if __name__ == "__main__":
+    main()